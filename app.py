@@ -4,145 +4,278 @@ import pandas as pd
 import os
 import sys # 用于获取当前 Python 解释器路径
 import time
+import shutil
+import threading
+from crawl_metrics import METRICS_FILE_ENV, RUN_ID_ENV, DEFAULT_METRICS_FILE, new_run_id, summarize_metrics
 
 # --- 配置 ---
-COLES_SCRIPT_NAME = 'coles_crawler.py'
-WOOLIES_SCRIPT_NAME = 'woolworths_crawler.py'
+# 所有超市由 crawl_all.py 通过共享调度器并行抓取
+CRAWL_SCRIPT_NAME = 'crawl_all.py'
 COLES_EXCEL_FILE = 'coles_data.xlsx'
 WOOLIES_EXCEL_FILE = 'woolworths_data.xlsx'
+SITE_EXCEL_FILES = {'Coles': COLES_EXCEL_FILE, 'Woolworths': WOOLIES_EXCEL_FILE}
+# 界面展示和下载使用的 Excel 快照副本目录，避免爬虫覆盖原文件时影响正在展示的数据
+SNAPSHOT_DIR = 'snapshots'
+# 爬虫子进程写入的指标文件（JSON Lines），每次运行结束后在日志中附上摘要
+METRICS_FILE = DEFAULT_METRICS_FILE
+# 后台定时刷新数据的间隔（秒）
+REFRESH_INTERVAL_SECONDS = 6 * 60 * 60
 
-# --- 核心功能：运行脚本、读取 Excel 并返回文件路径 ---
-def run_scrapers_and_get_data():
-    """
-    依次运行 Coles 和 Woolworths 的爬虫脚本，
-    然后尝试读取生成的 Excel 文件并返回 Pandas DataFrames 以及文件路径。
-    """
-    coles_df = pd.DataFrame() # 初始化为空 DataFrame
-    woolies_df = pd.DataFrame() # 初始化为空 DataFrame
-    run_status = [] # 用于记录运行状态
-    coles_filepath = None # 初始化文件路径为 None
-    woolies_filepath = None # 初始化文件路径为 None
-
-    # --- 运行 Coles 爬虫 ---
-    run_status.append(f"[{time.strftime('%H:%M:%S')}] 开始运行 {COLES_SCRIPT_NAME}...")
-    print(f"开始运行 {COLES_SCRIPT_NAME}...")
+def run_crawl_script(script_name, run_status, run_id):
+    """运行爬虫脚本，把结果写入 run_status。成功返回 True，失败返回错误描述。"""
+    run_status.append(f"[{time.strftime('%H:%M:%S')}] 开始运行 {script_name}...")
+    print(f"开始运行 {script_name}...")
     try:
-        result_coles = subprocess.run(
-            [sys.executable, COLES_SCRIPT_NAME],
+        result = subprocess.run(
+            [sys.executable, script_name],
             check=True,
             capture_output=True,
             text=True,
             encoding='utf-8',
-            timeout=600
+            timeout=600,
+            env={**os.environ, METRICS_FILE_ENV: METRICS_FILE, RUN_ID_ENV: run_id}
         )
-        print(f"--- {COLES_SCRIPT_NAME} 标准输出 ---")
-        print(result_coles.stdout)
-        print(f"--- {COLES_SCRIPT_NAME} 标准错误 ---")
-        print(result_coles.stderr)
-        print(f"--- {COLES_SCRIPT_NAME} 结束 ---")
-        run_status.append(f"[{time.strftime('%H:%M:%S')}] {COLES_SCRIPT_NAME} 运行成功。")
-
-        # 检查 Coles Excel 文件是否存在
-        if os.path.exists(COLES_EXCEL_FILE):
-            coles_filepath = COLES_EXCEL_FILE # 设置文件路径供下载
-            try:
-                coles_df = pd.read_excel(COLES_EXCEL_FILE)
-                run_status.append(f"[{time.strftime('%H:%M:%S')}] 成功加载 {COLES_EXCEL_FILE}。")
-                print(f"成功加载 {COLES_EXCEL_FILE}。")
-            except Exception as e:
-                error_msg = f"[{time.strftime('%H:%M:%S')}] 加载 {COLES_EXCEL_FILE} 出错: {e}"
-                run_status.append(error_msg)
-                print(error_msg)
-                coles_df = pd.DataFrame({"错误": [f"无法加载 {COLES_EXCEL_FILE}: {e}"]})
-                # 文件存在但无法读取，仍然提供下载路径让用户自行检查
-        else:
-            run_status.append(f"[{time.strftime('%H:%M:%S')}] 未找到 {COLES_EXCEL_FILE} 文件。脚本可能未生成数据或提前结束。")
-            print(f"未找到 {COLES_EXCEL_FILE} 文件。")
-            coles_df = pd.DataFrame({"信息": [f"{COLES_SCRIPT_NAME} 运行完成但未生成 {COLES_EXCEL_FILE}"]})
-
+        print(f"--- {script_name} 标准输出 ---")
+        print(result.stdout)
+        print(f"--- {script_name} 标准错误 ---")
+        print(result.stderr)
+        print(f"--- {script_name} 结束 ---")
+        run_status.append(f"[{time.strftime('%H:%M:%S')}] {script_name} 运行成功。")
+        return True
     except subprocess.CalledProcessError as e:
-        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {COLES_SCRIPT_NAME} 失败 (返回码 {e.returncode})。\n标准输出:\n{e.stdout}\n标准错误:\n{e.stderr}"
+        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {script_name} 失败 (返回码 {e.returncode})。\n标准输出:\n{e.stdout}\n标准错误:\n{e.stderr}"
         run_status.append(error_msg)
         print(error_msg)
-        coles_df = pd.DataFrame({"错误": [f"运行 {COLES_SCRIPT_NAME} 失败: {e.stderr[:500]}..."]})
+        return f"运行 {script_name} 失败: {e.stderr[:500]}..."
     except subprocess.TimeoutExpired as e:
-        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {COLES_SCRIPT_NAME} 超时。\n标准输出:\n{e.stdout}\n标准错误:\n{e.stderr}"
+        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {script_name} 超时。\n标准输出:\n{e.stdout}\n标准错误:\n{e.stderr}"
         run_status.append(error_msg)
         print(error_msg)
-        coles_df = pd.DataFrame({"错误": [f"运行 {COLES_SCRIPT_NAME} 超时"]})
+        return f"运行 {script_name} 超时"
     except Exception as e:
-        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {COLES_SCRIPT_NAME} 时发生未知错误: {e}"
+        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {script_name} 时发生未知错误: {e}"
         run_status.append(error_msg)
         print(error_msg)
-        coles_df = pd.DataFrame({"错误": [f"运行 {COLES_SCRIPT_NAME} 时发生未知错误: {e}"]})
+        return f"运行 {script_name} 时发生未知错误: {e}"
 
-    # --- 运行 Woolworths 爬虫 ---
-    run_status.append(f"\n[{time.strftime('%H:%M:%S')}] 开始运行 {WOOLIES_SCRIPT_NAME}...")
-    print(f"开始运行 {WOOLIES_SCRIPT_NAME}...")
-    try:
-        result_woolies = subprocess.run(
-            [sys.executable, WOOLIES_SCRIPT_NAME],
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            timeout=600
-        )
-        print(f"--- {WOOLIES_SCRIPT_NAME} 标准输出 ---")
-        print(result_woolies.stdout)
-        print(f"--- {WOOLIES_SCRIPT_NAME} 标准错误 ---")
-        print(result_woolies.stderr)
-        print(f"--- {WOOLIES_SCRIPT_NAME} 结束 ---")
-        run_status.append(f"[{time.strftime('%H:%M:%S')}] {WOOLIES_SCRIPT_NAME} 运行成功。")
-
-        # 检查 Woolworths Excel 文件是否存在
-        if os.path.exists(WOOLIES_EXCEL_FILE):
-            woolies_filepath = WOOLIES_EXCEL_FILE # 设置文件路径供下载
-            try:
-                woolies_df = pd.read_excel(WOOLIES_EXCEL_FILE)
-                run_status.append(f"[{time.strftime('%H:%M:%S')}] 成功加载 {WOOLIES_EXCEL_FILE}。")
-                print(f"成功加载 {WOOLIES_EXCEL_FILE}。")
-            except Exception as e:
-                error_msg = f"[{time.strftime('%H:%M:%S')}] 加载 {WOOLIES_EXCEL_FILE} 出错: {e}"
-                run_status.append(error_msg)
-                print(error_msg)
-                woolies_df = pd.DataFrame({"错误": [f"无法加载 {WOOLIES_EXCEL_FILE}: {e}"]})
-                # 文件存在但无法读取，仍然提供下载路径
-        else:
-            run_status.append(f"[{time.strftime('%H:%M:%S')}] 未找到 {WOOLIES_EXCEL_FILE} 文件。脚本可能未生成数据或提前结束。")
-            print(f"未找到 {WOOLIES_EXCEL_FILE} 文件。")
-            woolies_df = pd.DataFrame({"信息": [f"{WOOLIES_SCRIPT_NAME} 运行完成但未生成 {WOOLIES_EXCEL_FILE}"]})
+def load_site_snapshot(excel_file, run_status, written_after=None):
+    """
+    把爬虫生成的 Excel 文件复制到快照目录并读取，返回快照字典；文件不可用时返回 None。
+    指定 written_after 时，早于该时间的旧文件视为本次运行未生成。
+    快照使用独立的文件副本，之后的爬虫运行覆盖原文件时不会影响正在展示和下载的数据。
+    """
+    # 检查 Excel 文件是否存在
+    if not os.path.exists(excel_file):
+        run_status.append(f"[{time.strftime('%H:%M:%S')}] 未找到 {excel_file} 文件。脚本可能未生成数据或提前结束。")
+        print(f"未找到 {excel_file} 文件。")
+        return None
+    updated_at = os.path.getmtime(excel_file)
+    if written_after is not None and updated_at < written_after:
+        run_status.append(f"[{time.strftime('%H:%M:%S')}] 本次运行未更新 {excel_file}，磁盘上只有旧文件。")
+        print(f"本次运行未更新 {excel_file}。")
+        return None
 
-    except subprocess.CalledProcessError as e:
-        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {WOOLIES_SCRIPT_NAME} 失败 (返回码 {e.returncode})。\n标准输出:\n{e.stdout}\n标准错误:\n{e.stderr}"
-        run_status.append(error_msg)
-        print(error_msg)
-        woolies_df = pd.DataFrame({"错误": [f"运行 {WOOLIES_SCRIPT_NAME} 失败: {e.stderr[:500]}..."]})
-    except subprocess.TimeoutExpired as e:
-        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {WOOLIES_SCRIPT_NAME} 超时。\n标准输出:\n{e.stdout}\n标准错误:\n{e.stderr}"
-        run_status.append(error_msg)
-        print(error_msg)
-        woolies_df = pd.DataFrame({"错误": [f"运行 {WOOLIES_SCRIPT_NAME} 超时"]})
+    stem = os.path.splitext(os.path.basename(excel_file))[0]
+    snapshot_file = os.path.join(
+        SNAPSHOT_DIR, f"{stem}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(updated_at))}.xlsx"
+    )
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        shutil.copy2(excel_file, snapshot_file)
+        df = pd.read_excel(snapshot_file)
+        run_status.append(f"[{time.strftime('%H:%M:%S')}] 成功加载 {excel_file}。")
+        print(f"成功加载 {excel_file}。")
+        return {'df': df, 'filepath': snapshot_file, 'updated_at': updated_at}
     except Exception as e:
-        error_msg = f"[{time.strftime('%H:%M:%S')}] 运行 {WOOLIES_SCRIPT_NAME} 时发生未知错误: {e}"
+        error_msg = f"[{time.strftime('%H:%M:%S')}] 加载 {excel_file} 出错: {e}"
         run_status.append(error_msg)
         print(error_msg)
-        woolies_df = pd.DataFrame({"错误": [f"运行 {WOOLIES_SCRIPT_NAME} 时发生未知错误: {e}"]})
+        return None
+
+# --- 核心功能：运行脚本并读取生成的 Excel 文件 ---
+def run_scrapers_and_get_data():
+    """
+    通过共享调度器并行运行 Coles 和 Woolworths 爬虫，然后读取本次运行生成的 Excel 文件。
+    返回 (状态文本, {站点名称: 快照字典或 None}, 脚本结果)，脚本成功时结果为 True，否则为错误描述。
+    """
+    run_status = [] # 用于记录运行状态
+    run_id = new_run_id()
+    started_at = time.time()
+    outcome = run_crawl_script(CRAWL_SCRIPT_NAME, run_status, run_id)
 
+    # 各站点完成后会立即写出文件，因此即使脚本失败或超时，也加载本次运行已生成的文件
+    snapshots = {
+        site: load_site_snapshot(excel_file, run_status, written_after=started_at)
+        for site, excel_file in SITE_EXCEL_FILES.items()
+    }
+
+    run_status.append("\n" + summarize_metrics(METRICS_FILE, run_id))
     run_status.append(f"\n[{time.strftime('%H:%M:%S')}] 所有脚本执行完毕。")
     print("所有脚本执行完毕。")
 
-    # 返回状态文本、两个 DataFrame 和两个文件路径
-    return "\n".join(run_status), coles_df, woolies_df, coles_filepath, woolies_filepath
+    return "\n".join(run_status), snapshots, outcome
+
+def format_age(seconds):
+    """把秒数转换为“X 小时 Y 分钟”形式的可读文本。"""
+    seconds = int(max(seconds, 0))
+    if seconds < 60:
+        return f"{seconds} 秒"
+    minutes = seconds // 60
+    if minutes < 60:
+        return f"{minutes} 分钟"
+    return f"{minutes // 60} 小时 {minutes % 60} 分钟"
+
+class DatasetRefresher:
+    """
+    在后台线程中定时运行爬虫，并按站点保存最近一次成功加载的数据快照。
+    界面只读取快照，不会阻塞等待爬虫；多个刷新请求同时到达时只会运行一次爬虫。
+    某个站点刷新失败时保留它上一次成功的快照。
+    """
+
+    def __init__(self, interval_seconds=REFRESH_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._stop_event = threading.Event()
+        self._snapshots = {}
+        self._status = ""
+        self._last_error = None
+        self._load_existing_files()
+
+    def _load_existing_files(self):
+        """启动时如果已有上次生成的 Excel 文件，则直接作为初始快照。"""
+        run_status = [f"[{time.strftime('%H:%M:%S')}] 从磁盘加载上次抓取的数据。"]
+        for site, excel_file in SITE_EXCEL_FILES.items():
+            if os.path.exists(excel_file):
+                snapshot = load_site_snapshot(excel_file, run_status)
+                if snapshot is not None:
+                    self._snapshots[site] = snapshot
+        self._status = "\n".join(run_status)
+        self._prune_snapshot_files()
+
+    def _prune_snapshot_files(self):
+        """删除已不再被任何快照引用的文件副本。"""
+        in_use = {os.path.abspath(s['filepath']) for s in self._snapshots.values()}
+        if not os.path.isdir(SNAPSHOT_DIR):
+            return
+        for name in os.listdir(SNAPSHOT_DIR):
+            path = os.path.abspath(os.path.join(SNAPSHOT_DIR, name))
+            if path not in in_use:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    @property
+    def is_refreshing(self):
+        return self._refresh_thread is not None and self._refresh_thread.is_alive()
+
+    def request_refresh(self):
+        """在后台开始一次刷新；已有刷新在进行时直接复用它。返回是否新启动了刷新。"""
+        with self._lock:
+            if self.is_refreshing:
+                return False
+            self._refresh_thread = threading.Thread(target=self._refresh, daemon=True)
+            self._refresh_thread.start()
+            return True
+
+    def _refresh(self):
+        try:
+            status, snapshots, outcome = run_scrapers_and_get_data()
+        except Exception as e:
+            self._last_error = f"[{time.strftime('%H:%M:%S')}] 后台刷新失败: {e}，继续显示上次成功的数据。"
+            print(self._last_error)
+            return
+
+        failed_sites = [site for site, snapshot in snapshots.items() if snapshot is None]
+        with self._lock:
+            self._status = status
+            for site, snapshot in snapshots.items():
+                if snapshot is not None:
+                    self._snapshots[site] = snapshot
+            if outcome is True and not failed_sites:
+                self._last_error = None
+            else:
+                reason = outcome if outcome is not True else "脚本未报告错误"
+                not_updated = "、".join(failed_sites) if failed_sites else "无"
+                self._last_error = (
+                    f"[{time.strftime('%H:%M:%S')}] 上次后台刷新未完全成功（{reason}）。"
+                    f"未更新的站点: {not_updated}，这些站点继续显示上次成功的数据。"
+                )
+            self._prune_snapshot_files()
+
+    def _seconds_until_first_refresh(self):
+        """启动时按最旧快照的年龄决定首次刷新时间；缺少任一站点的快照时立即刷新。"""
+        with self._lock:
+            snapshots = dict(self._snapshots)
+        if any(snapshots.get(site) is None for site in SITE_EXCEL_FILES):
+            return 0
+        oldest_age = time.time() - min(s['updated_at'] for s in snapshots.values())
+        return max(self.interval_seconds - oldest_age, 0)
+
+    def _schedule_loop(self):
+        # 重启应用时不必为几分钟前刚抓取的数据立即再运行一次爬虫
+        delay = self._seconds_until_first_refresh()
+        if delay:
+            print(f"已有数据尚未过期，{format_age(delay)}后开始首次后台刷新。")
+        self._stop_event.wait(delay)
+        while not self._stop_event.is_set():
+            self.request_refresh()
+            self._stop_event.wait(self.interval_seconds)
+
+    def start_schedule(self):
+        threading.Thread(target=self._schedule_loop, daemon=True).start()
+
+    def stop_schedule(self):
+        self._stop_event.set()
+
+    def get_latest(self, trigger_refresh=False):
+        """立即返回最近的快照（附带每个站点的数据年龄），可选地在后台触发一次刷新。"""
+        started = self.request_refresh() if trigger_refresh else False
+        with self._lock:
+            snapshots = dict(self._snapshots)
+            status = self._status
+            last_error = self._last_error
+
+        if not snapshots and not self.is_refreshing:
+            started = self.request_refresh() or started
+
+        header = []
+        now = time.time()
+        outputs = {}
+        for site in SITE_EXCEL_FILES:
+            snapshot = snapshots.get(site)
+            if snapshot is None:
+                header.append(f"{site}: 尚无可用数据。")
+                outputs[site] = (pd.DataFrame({"信息": [f"{site} 尚无可用数据，请等待后台抓取完成后再试。"]}), None)
+                continue
+            updated_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot['updated_at']))
+            header.append(f"{site}: 数据更新于 {updated_at}（{format_age(now - snapshot['updated_at'])}前）。")
+            outputs[site] = (snapshot['df'], snapshot['filepath'])
+
+        if started:
+            header.append("已在后台开始刷新数据（需要几分钟），完成后再次点击按钮即可查看新数据。")
+        elif self.is_refreshing:
+            header.append("后台刷新正在进行中，完成后再次点击按钮即可查看新数据。")
+        if last_error:
+            header.append(last_error)
+
+        coles_df, coles_filepath = outputs['Coles']
+        woolies_df, woolies_filepath = outputs['Woolworths']
+        return ("\n".join(header) + "\n\n" + status, coles_df, woolies_df, coles_filepath, woolies_filepath)
+
+refresher = DatasetRefresher()
 
 # --- 创建 Gradio 界面 ---
 with gr.Blocks() as demo:
     gr.Markdown("# Coles & Woolworths 半价商品爬虫")
-    gr.Markdown("点击下面的按钮运行爬虫脚本。脚本需要 **几分钟** 时间执行（取决于网络速度和网站结构），请耐心等待。")
+    gr.Markdown(f"爬虫在后台每 {format_age(REFRESH_INTERVAL_SECONDS)}自动运行一次。点击下面的按钮会立即显示最近一次抓取的结果及其更新时间；勾选“在后台刷新数据”可同时触发一次新的抓取（需要 **几分钟**，完成后再次点击即可看到新数据）。")
     gr.Markdown("**注意:** 爬虫脚本依赖于特定的网站结构，如果 Coles 或 Woolworths 网站更新，脚本可能会失效。")
     gr.Markdown("**重要提示:** Coles 爬虫脚本 (`coles_crawler.py`) 中可能硬编码了 Chrome 用户配置路径。如果遇到权限或路径错误，请检查并修改 `coles_crawler.py` 中的 `user_data_dir` 变量。") # 稍微修改提示
 
-    run_button = gr.Button("🚀 运行爬虫并显示结果")
+    with gr.Row():
+        run_button = gr.Button("🚀 显示最新结果")
+        refresh_checkbox = gr.Checkbox(label="在后台刷新数据", value=False)
 
     with gr.Row():
         status_output = gr.Textbox(label="运行日志", lines=10, interactive=False, scale=2) # 增加 scale 使日志框更宽
@@ -159,11 +292,11 @@ with gr.Blocks() as demo:
             # 添加 Woolworths 下载文件组件
             woolies_download = gr.File(label=f"下载 {WOOLIES_EXCEL_FILE}", interactive=False)
 
-    # 当按钮被点击时，执行 run_scrapers_and_get_data 函数
+    # 当按钮被点击时，立即返回最近的数据快照，可选地触发后台刷新
     # 输出会更新到 status_output, coles_output_df, woolies_output_df, coles_download, woolies_download
     run_button.click(
-        fn=run_scrapers_and_get_data,
-        inputs=None, # 没有输入
+        fn=refresher.get_latest,
+        inputs=[refresh_checkbox],
         outputs=[status_output, coles_output_df, woolies_output_df, coles_download, woolies_download] # 增加两个文件输出
     )
 
@@ -171,4 +304,5 @@ with gr.Blocks() as demo:
 if __name__ == "__main__":
     # share=True 会创建一个公开链接，但请注意安全风险
     # In a secure environment, you might remove share=True
+    refresher.start_schedule()
     demo.launch(server_name="0.0.0.0") # 默认不在 Colab 等环境中创建分享链接
\ No newline at end of file
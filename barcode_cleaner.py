@@ -0,0 +1,24 @@
+import re
+
+# 正则表达式模式：匹配一个由12或13位数字组成的完整单词
+# \b 是单词边界，确保我们不会匹配一个更长数字的一部分
+BARCODE_PATTERN = re.compile(r'\b(\d{12,13})\b')
+
+def clean_barcode(barcode_data):
+    """
+    清理条形码数据。
+    如果数据是字符串，则尝试用正则表达式提取12或13位的数字条形码。
+    如果找不到匹配项，或者数据不是字符串（例如，已经是数字或空值），则返回原数据。
+    """
+    # 检查输入是否为字符串，如果不是则直接返回
+    if not isinstance(barcode_data, str):
+        return barcode_data
+
+    # 在字符串中搜索该模式
+    match = BARCODE_PATTERN.search(barcode_data)
+
+    # 如果找到了匹配项，返回第一个匹配到的分组（即纯数字条形码）
+    if match:
+        return match.group(1)
+    else:
+        return "Not Found"
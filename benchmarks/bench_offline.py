@@ -0,0 +1,288 @@
+"""
+离线基准测试：不需要浏览器和网络。
+
+- 生成含 N 个商品卡片的 Coles / Woolworths 合成结果页，测量 MHTML 解码和商品解析速度（页/秒）
+- 生成 1万 / 10万 / 100万 行的合成商品目录，测量条形码清理和价格解析速度（行/秒）
+- 测量比价合并（build_price_comparison）的耗时和峰值内存
+
+每次运行的结果追加写入 benchmarks/results.jsonl，并与最近一次参数相同的运行对比。
+用法: python benchmarks/bench_offline.py [--pages 20] [--tiles 48] [--sizes 10000 100000 1000000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+# 基准测试过程中不写入正式的指标文件
+os.environ.setdefault('CRAWL_METRICS_FILE', os.devnull)
+
+import pandas as pd
+from bs4 import BeautifulSoup
+from crawl_scheduler import extract_html_from_mhtml_string
+from coles_crawler import ColesAdapter
+from woolworths_crawler import WoolworthsAdapter
+from barcode_cleaner import clean_barcode
+from price_comparator_app import parse_price_column, build_price_comparison
+
+RESULTS_FILE = os.path.join(REPO_ROOT, 'benchmarks', 'results.jsonl')
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+WORDS = ['coles', 'woolworths', 'organic', 'chicken', 'milk', 'bread', 'chocolate', 'pasta',
+         'sauce', 'coffee', 'tea', 'rice', 'cheese', 'yoghurt', 'apple', 'juice']
+
+# --- 合成数据 ---
+
+def make_product_name(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+
+def make_price(rng):
+    return f"${rng.uniform(0.5, 1500):,.2f}"
+
+def make_coles_page(rng, tiles):
+    parts = ["<html><body><div class='product-grid'>"]
+    for _ in range(tiles):
+        slug = make_product_name(rng).replace(" ", "-")
+        code = rng.randint(1000000, 9999999)
+        parts.append(
+            f"<section class='product'>"
+            f"<div class='product__message-title_area'><a href='/product/{slug}-{code}'>{slug}</a></div>"
+            f"<section class='product__pricing'>"
+            f"<span class='price__value'>{make_price(rng)}</span>"
+            f"<span class='price__was'> | Was {make_price(rng)}</span>"
+            f"<div class='price__calculation_method'>$1.20 per 100g</div>"
+            f"</section></section>"
+        )
+    parts.append("</div></body></html>")
+    return "".join(parts)
+
+def make_woolworths_page(rng, tiles):
+    parts = ["<html><body><div class='paging'>"
+             "<a class='paging-pageNumber'>1</a><a class='paging-pageNumber'>20</a></div>"]
+    for _ in range(tiles):
+        name = make_product_name(rng)
+        parts.append(
+            f"<div class='product-tile-content'>"
+            f"<div class='title'><a href='/shop/productdetails/{rng.randint(1000, 999999)}'><span></span>{name}</a></div>"
+            f"<div class='primary'><span></span>{make_price(rng)}</div>"
+            f"<span class='was-price'><span></span>Was {make_price(rng)}</span>"
+            f"<span class='price-per-cup'><span></span>$0.80 / 100g</span>"
+            f"</div>"
+        )
+    parts.append("</body></html>")
+    return "".join(parts)
+
+def wrap_mhtml(html_content):
+    """包装成与 Page.captureSnapshot 输出结构相同的 MHTML。"""
+    return (
+        "From: <Saved by Blink>\n"
+        "MIME-Version: 1.0\n"
+        'Content-Type: multipart/related; type="text/html"; boundary="----MultipartBoundary--"\n\n'
+        "------MultipartBoundary--\n"
+        "Content-Type: text/html\n"
+        "Content-Transfer-Encoding: quoted-printable\n\n"
+        f"{html_content.replace('=', '=3D')}\n"
+        "------MultipartBoundary----\n"
+    )
+
+def make_barcode_answer(rng):
+    """模拟条形码查询 API 的原始返回文本。"""
+    roll = rng.random()
+    barcode = "".join(str(rng.randint(0, 9)) for _ in range(13))
+    if roll < 0.5:
+        return barcode
+    if roll < 0.8:
+        return f"The Australian barcode for this product is {barcode}."
+    if roll < 0.95:
+        return "Not Found"
+    return None
+
+def make_catalog(rng, rows, barcode_pool):
+    return pd.DataFrame({
+        '产品名称': [make_product_name(rng) for _ in range(rows)],
+        '产品链接': [f"/product/{i}" for i in range(rows)],
+        '现价': [make_price(rng) for _ in range(rows)],
+        '条形码': [rng.choice(barcode_pool) for _ in range(rows)],
+        '条形码原文': [make_barcode_answer(rng) for _ in range(rows)],
+    })
+
+# --- 基准测试 ---
+
+def bench_extraction(rng, adapter, make_page, pages, tiles):
+    mhtml_pages = [wrap_mhtml(make_page(rng, tiles)) for _ in range(pages)]
+
+    started = time.perf_counter()
+    html_pages = [extract_html_from_mhtml_string(page) for page in mhtml_pages]
+    decode_seconds = time.perf_counter() - started
+
+    products = 0
+    started = time.perf_counter()
+    for page_number, html_content in enumerate(html_pages, start=1):
+        soup = BeautifulSoup(html_content, 'html.parser')
+        products += len(adapter.extract_products(soup, page_number))
+    extract_seconds = time.perf_counter() - started
+
+    if products != pages * tiles:
+        raise RuntimeError(f"{adapter.name}: 期望解析 {pages * tiles} 个商品，实际得到 {products} 个")
+    return {
+        'pages': pages,
+        'tiles_per_page': tiles,
+        'decode_pages_per_s': pages / decode_seconds,
+        'extract_pages_per_s': pages / extract_seconds,
+        'extract_products_per_s': products / extract_seconds,
+    }
+
+def bench_catalog(rng, rows):
+    # 条形码池大小小于行数，使两个目录之间有重叠，并包含重复条形码
+    barcode_pool = [str(9300000000000 + i) for i in range(int(rows * 0.8))]
+    df_coles = make_catalog(rng, rows, barcode_pool)
+    df_ww = make_catalog(rng, rows, barcode_pool)
+
+    started = time.perf_counter()
+    df_coles['条形码原文'].apply(clean_barcode)
+    clean_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parse_price_column(df_coles['现价'])
+    price_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    final_df, _ = build_price_comparison(df_coles, df_ww, '现价', '现价')
+    compare_seconds = time.perf_counter() - started
+
+    # tracemalloc 会明显拖慢执行，因此峰值内存单独再跑一次测量
+    tracemalloc.start()
+    build_price_comparison(df_coles, df_ww, '现价', '现价')
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'rows': rows,
+        'clean_barcode_rows_per_s': rows / clean_seconds,
+        'parse_price_rows_per_s': rows / price_seconds,
+        'compare_seconds': compare_seconds,
+        'compare_peak_mb': peak_bytes / 1024 / 1024,
+        'compare_output_rows': len(final_df),
+    }
+
+# --- 结果保存与对比 ---
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_previous_runs():
+    try:
+        with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return []
+
+def find_previous_extraction(previous_runs, params):
+    """最近一次页数、卡片数和随机种子都相同的运行，参数不同的结果没有可比性。"""
+    keys = ('pages', 'tiles', 'seed')
+    for previous_run in reversed(previous_runs):
+        if all(previous_run.get('params', {}).get(k) == params[k] for k in keys):
+            return previous_run
+    return None
+
+def find_previous_catalog(previous_runs, params, rows):
+    """最近一次包含相同行数、相同随机种子的商品目录结果。"""
+    for previous_run in reversed(previous_runs):
+        if previous_run.get('params', {}).get('seed') != params['seed']:
+            continue
+        for result in previous_run.get('catalog', []):
+            if result['rows'] == rows:
+                return previous_run, result
+    return None, None
+
+def format_change(name, value, previous, higher_is_better=True):
+    if previous is None or not previous.get(name):
+        return f"{value:,.2f}"
+    change = (value - previous[name]) / previous[name] * 100
+    if abs(change) < 0.05:
+        verdict = "持平"
+    else:
+        improved = change > 0 if higher_is_better else change < 0
+        verdict = "改善" if improved else "退化"
+    return f"{value:,.2f} ({change:+.1f}% {verdict})"
+
+def describe_run(previous_run):
+    return f"{previous_run.get('timestamp')} @ {previous_run.get('git_revision')}"
+
+def print_results(run, previous_runs):
+    params = run['params']
+    previous_run = find_previous_extraction(previous_runs, params)
+    previous_extraction = (previous_run or {}).get('extraction', {})
+
+    print("商品解析 (页/秒，越高越好):")
+    if previous_run:
+        print(f"  对比基准: {describe_run(previous_run)}")
+    elif previous_runs:
+        print("  警告: 没有页数、卡片数和随机种子都相同的历史运行，不做对比。")
+    for site, result in run['extraction'].items():
+        previous = previous_extraction.get(site)
+        print(f"  {site}: 解码 {format_change('decode_pages_per_s', result['decode_pages_per_s'], previous)}，"
+              f"解析 {format_change('extract_pages_per_s', result['extract_pages_per_s'], previous)}")
+
+    print("商品目录 (清理/解析为行/秒，越高越好；合并耗时和峰值内存越低越好):")
+    for result in run['catalog']:
+        previous_run, previous = find_previous_catalog(previous_runs, params, result['rows'])
+        baseline = f"  [对比 {describe_run(previous_run)}]" if previous_run else "  [无相同行数的历史运行]"
+        print(f"  {result['rows']:,} 行: "
+              f"条形码清理 {format_change('clean_barcode_rows_per_s', result['clean_barcode_rows_per_s'], previous)} 行/秒，"
+              f"价格解析 {format_change('parse_price_rows_per_s', result['parse_price_rows_per_s'], previous)} 行/秒，"
+              f"比价合并耗时 {format_change('compare_seconds', result['compare_seconds'], previous, higher_is_better=False)} 秒，"
+              f"峰值内存 {format_change('compare_peak_mb', result['compare_peak_mb'], previous, higher_is_better=False)} MB"
+              f"{baseline}")
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试：商品解析、条形码清理、价格解析和比价合并")
+    parser.add_argument('--pages', type=int, default=20, help="每个站点生成的结果页数量")
+    parser.add_argument('--tiles', type=int, default=48, help="每页商品卡片数量")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="合成商品目录的行数")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-save', action='store_true', help="不把结果写入 results.jsonl")
+    args = parser.parse_args()
+
+    run = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'params': {'pages': args.pages, 'tiles': args.tiles, 'sizes': args.sizes, 'seed': args.seed},
+        'extraction': {},
+        'catalog': [],
+    }
+
+    for adapter, make_page in [(ColesAdapter(), make_coles_page), (WoolworthsAdapter(), make_woolworths_page)]:
+        print(f"正在测试 {adapter.name} 页面解析...")
+        # 每项测试使用独立的随机数生成器，使合成数据只取决于种子和该项自身的参数
+        rng = random.Random(f"{args.seed}:{adapter.name}")
+        run['extraction'][adapter.name] = bench_extraction(rng, adapter, make_page, args.pages, args.tiles)
+    for rows in args.sizes:
+        print(f"正在测试 {rows:,} 行商品目录...")
+        rng = random.Random(f"{args.seed}:{rows}")
+        run['catalog'].append(bench_catalog(rng, rows))
+
+    print("-" * 40)
+    print_results(run, load_previous_runs())
+
+    if not args.no_save:
+        with open(RESULTS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + "\n")
+        print(f"结果已追加到 {RESULTS_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import sys
+from crawl_scheduler import CrawlScheduler, exit_code
+from coles_crawler import ColesAdapter
+from woolworths_crawler import WoolworthsAdapter
+
+# 新增超市时，只需编写对应的 SiteAdapter 并加入这个列表
+ADAPTERS = [ColesAdapter, WoolworthsAdapter]
+
+if __name__ == "__main__":
+    results = CrawlScheduler([adapter() for adapter in ADAPTERS]).run()
+    sys.exit(exit_code(results))
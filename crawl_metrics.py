@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# --- 配置 ---
+
+# 指标以 JSON Lines 格式追加写入该文件，可通过环境变量覆盖
+METRICS_FILE_ENV = 'CRAWL_METRICS_FILE'
+DEFAULT_METRICS_FILE = 'crawl_metrics.jsonl'
+# 同一次运行的所有记录共享一个 run_id，app.py 通过环境变量传给子进程
+RUN_ID_ENV = 'CRAWL_RUN_ID'
+
+def new_run_id():
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+class MetricsRecorder:
+    """
+    记录各阶段耗时和计数器，每条记录写成一行 JSON：
+    {"run_id": ..., "ts": ..., "type": "timing", "stage": "navigation", "seconds": 1.2, "labels": {...}}
+    {"run_id": ..., "ts": ..., "type": "counter", "name": "products", "value": 48, "labels": {...}}
+    """
+
+    def __init__(self, path=None, run_id=None):
+        self.path = path or os.environ.get(METRICS_FILE_ENV, DEFAULT_METRICS_FILE)
+        self.run_id = run_id or os.environ.get(RUN_ID_ENV) or new_run_id()
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        record = {'run_id': self.run_id, 'ts': round(time.time(), 3), **record}
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                # 指标写入失败不应影响爬虫本身
+                print(f"写入指标文件 '{self.path}' 失败: {e}")
+
+    def observe(self, stage, seconds, **labels):
+        self._write({'type': 'timing', 'stage': stage, 'seconds': round(seconds, 6), 'labels': labels})
+
+    def incr(self, name, value=1, **labels):
+        self._write({'type': 'counter', 'name': name, 'value': value, 'labels': labels})
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """计时上下文管理器；代码块抛出异常时同样记录耗时，并标记 error=True。"""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            labels['error'] = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started, **labels)
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize_metrics(path=None, run_id=None):
+    """读取指标文件，返回指定运行（默认最后一次运行）的文字摘要。"""
+    path = path or os.environ.get(METRICS_FILE_ENV, DEFAULT_METRICS_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError) as e:
+        return f"无法读取指标文件 '{path}': {e}"
+    if not records:
+        return f"指标文件 '{path}' 中没有记录。"
+    if run_id is None:
+        run_id = records[-1].get('run_id')
+    records = [r for r in records if r.get('run_id') == run_id]
+    if not records:
+        return f"指标文件 '{path}' 中没有运行 {run_id} 的记录。"
+
+    timings = {}
+    counters = {}
+    for record in records:
+        site = record.get('labels', {}).get('site')
+        if record['type'] == 'timing':
+            timings.setdefault((record['stage'], site), []).append(record['seconds'])
+        elif record['type'] == 'counter':
+            key = (record['name'], site)
+            counters[key] = counters.get(key, 0) + record['value']
+
+    lines = [f"运行 {run_id} 的指标摘要："]
+    for (stage, site), values in sorted(timings.items(), key=lambda item: (item[0][1] or '', item[0][0])):
+        values.sort()
+        name = f"{site}/{stage}" if site else stage
+        lines.append(
+            f"  {name}: {len(values)} 次，总计 {sum(values):.2f}s，"
+            f"平均 {sum(values) / len(values):.3f}s，p95 {_percentile(values, 0.95):.3f}s，最大 {values[-1]:.3f}s"
+        )
+    for (counter, site), value in sorted(counters.items(), key=lambda item: (item[0][1] or '', item[0][0])):
+        name = f"{site}/{counter}" if site else counter
+        lines.append(f"  {name}: {value}")
+    return "\n".join(lines)
+
+# 模块级默认记录器，各脚本直接导入使用
+metrics = MetricsRecorder()
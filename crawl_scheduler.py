@@ -0,0 +1,388 @@
+import time
+import queue
+import threading
+from urllib.parse import urlparse
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+import base64
+import email
+import quopri
+from bs4 import BeautifulSoup
+import pandas as pd
+from crawl_metrics import metrics
+
+# --- 配置 ---
+
+# 所有站点共享的全局并发预算：同一时刻最多有多少个浏览器会话在加载页面。
+MAX_CONCURRENCY = 4
+# 单个页面失败后的最大重试次数
+MAX_RETRIES = 2
+# 第 N 次重试前等待 N * RETRY_BACKOFF_SECONDS 秒
+RETRY_BACKOFF_SECONDS = 10
+
+# --- MHTML 解析函数 ---
+def extract_html_from_mhtml_string(mhtml_data_string):
+    try:
+        msg = email.message_from_string(mhtml_data_string)
+        html_content = None
+        charset = 'utf-8'
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            if content_type == 'text/html':
+                transfer_encoding = part.get('Content-Transfer-Encoding', '').lower()
+                part_charset = part.get_content_charset()
+                if part_charset:
+                    charset = part_charset
+                payload = part.get_payload(decode=False)
+                payload_bytes = None
+                if isinstance(payload, bytes): payload_bytes = payload
+                elif isinstance(payload, str):
+                    if transfer_encoding == 'base64':
+                        try:
+                            payload_clean = "".join(payload.split())
+                            payload_bytes = base64.b64decode(payload_clean)
+                        except base64.binascii.Error: continue
+                    elif transfer_encoding == 'quoted-printable':
+                        try: payload_bytes = quopri.decodestring(payload.encode('ascii', errors='ignore'))
+                        except Exception:
+                            try: payload_bytes = payload.encode(charset, errors='ignore')
+                            except Exception: continue
+                    elif transfer_encoding in ('8bit', '7bit', 'binary', ''):
+                       try: payload_bytes = payload.encode(charset, errors='ignore')
+                       except Exception: continue
+                    else:
+                       try: payload_bytes = payload.encode(charset, errors='ignore')
+                       except Exception: continue
+                else: continue
+                if payload_bytes is not None:
+                    try:
+                        html_content = payload_bytes.decode(charset, errors='replace')
+                        break
+                    except Exception: html_content = None
+        return html_content
+    except Exception as e:
+        print(f"处理 MHTML 字符串时发生错误: {e}")
+        return None
+
+class SiteAdapter:
+    """
+    站点适配器基类。
+    每个超市只需要提供URL规划（page_url / total_pages）和商品卡片解析（extract_products），
+    浏览器会话、并发、按域名限速、重试和 Excel 输出都由 CrawlScheduler 负责。
+    """
+
+    name = None
+    output_excel_file = None
+    # 输出 Excel 的列顺序，extract_products 返回的字典使用这些列名作为键
+    columns = []
+    # 同一域名两次页面请求之间的最小间隔（秒）
+    min_request_interval = 5.0
+    # 页面打开后等待渲染完成的时间（秒）
+    ready_wait_seconds = 5
+    # 该站点同时使用的浏览器会话数
+    max_sessions = 1
+    max_pages = 100
+    # 总页数未知时，连续这么多页全部重试失败就停止抓取（通常说明被网站拦截）
+    max_consecutive_failures = 3
+
+    @property
+    def domain(self):
+        return urlparse(self.page_url(1)).netloc
+
+    def configure_options(self, chrome_options):
+        """在创建浏览器前添加站点特有的 Chrome 参数。"""
+
+    def warm_up(self, driver):
+        """浏览器会话创建后、开始抓取前执行的准备工作（例如先访问首页）。"""
+
+    def page_url(self, page_number):
+        raise NotImplementedError
+
+    def total_pages(self, soup):
+        """从第一页解析总页数；返回 None 表示未知，此时逐页抓取直到某页没有商品。"""
+        return None
+
+    def extract_products(self, soup, page_number):
+        """从页面中解析商品，返回字典列表。"""
+        raise NotImplementedError
+
+class DomainRateLimiter:
+    """保证同一域名的两次请求之间至少间隔 min_interval 秒（跨所有会话生效）。"""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_allowed)
+            self._next_allowed = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class SiteCrawl:
+    """单个站点的运行状态：待抓取页面、已完成页面的结果和失败记录。"""
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.total_pages = None
+        self.products_by_page = {}
+        self.failed_pages = []
+        self.consecutive_failures = 0
+        self._pages = queue.Queue()
+        self._pending = 0
+        self._sessions = 0
+        self._aborted = False
+        self._cond = threading.Condition()
+
+    def add_page(self, page_number):
+        if page_number > self.adapter.max_pages:
+            return
+        with self._cond:
+            self._pending += 1
+            self._pages.put(page_number)
+            self._cond.notify()
+
+    def next_page(self):
+        """取出下一个待抓取的页码；所有页面都处理完毕时返回 None。"""
+        with self._cond:
+            while True:
+                if self._aborted:
+                    return None
+                try:
+                    return self._pages.get_nowait()
+                except queue.Empty:
+                    pass
+                if self._pending == 0:
+                    return None
+                self._cond.wait()
+
+    def page_done(self):
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
+
+    def abort(self):
+        with self._cond:
+            self._aborted = True
+            self._cond.notify_all()
+
+    def session_started(self):
+        with self._cond:
+            self._sessions += 1
+
+    def session_finished(self):
+        with self._cond:
+            self._sessions -= 1
+
+    def session_failed(self, page_number):
+        """
+        某个浏览器会话无法继续时调用：把它正在处理的页面放回队列交给其他会话。
+        该站点已没有其他会话时放弃整个站点，返回 False。
+        """
+        with self._cond:
+            self._sessions -= 1
+            if self._sessions > 0:
+                self._pending += 1
+                self._pages.put(page_number)
+                self._cond.notify()
+                return True
+            self._aborted = True
+            self._cond.notify_all()
+            return False
+
+    def rows(self):
+        rows = []
+        for page_number in sorted(self.products_by_page):
+            rows.extend(self.products_by_page[page_number])
+        return rows
+
+class CrawlScheduler:
+    """
+    多站点共享的爬取调度器。
+    所有站点并行抓取，但共用一个全局并发预算；同一域名的请求按适配器配置限速，
+    失败的页面会按退避时间重试。
+    """
+
+    def __init__(self, adapters, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.crawls = [SiteCrawl(adapter) for adapter in adapters]
+        self.max_retries = max_retries
+        self.budget = threading.BoundedSemaphore(max_concurrency)
+        self.rate_limiters = {}
+        for adapter in adapters:
+            limiter = self.rate_limiters.get(adapter.domain)
+            if limiter is None or limiter.min_interval < adapter.min_request_interval:
+                self.rate_limiters[adapter.domain] = DomainRateLimiter(adapter.min_request_interval)
+
+    def _create_driver(self, adapter):
+        chrome_options = webdriver.ChromeOptions()
+        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        adapter.configure_options(chrome_options)
+
+        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+        driver.set_window_size(1920, 1080)
+        return driver
+
+    def _load_page(self, driver, adapter, page_number):
+        """
+        打开页面并返回解析好的 BeautifulSoup；只有加载页面期间占用全局并发预算。
+        先取得并发预算再按域名限速，否则在预算上排队的会话被同时放行时会连续请求同一域名。
+        """
+        site = adapter.name
+        with self.budget:
+            with metrics.timer('rate_limit_wait', site=site):
+                self.rate_limiters[adapter.domain].wait()
+            with metrics.timer('navigation', site=site):
+                driver.get(adapter.page_url(page_number))
+            with metrics.timer('ready_wait', site=site):
+                time.sleep(adapter.ready_wait_seconds)
+            with metrics.timer('snapshot', site=site):
+                mhtml_content = driver.execute_cdp_cmd('Page.captureSnapshot', {'format': 'mhtml'})['data']
+        with metrics.timer('decode', site=site):
+            html_content = extract_html_from_mhtml_string(mhtml_content)
+        if not html_content:
+            raise ValueError(f"未能在第 {page_number} 页的 MHTML 中找到有效的 HTML 内容部分")
+        with metrics.timer('parse', site=site):
+            return BeautifulSoup(html_content, 'html.parser')
+
+    def _crawl_page(self, driver, crawl, page_number):
+        """抓取并解析单个页面（含重试），返回商品列表；全部重试失败时返回 None。"""
+        adapter = crawl.adapter
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                print(f"[{adapter.name}] 第 {page_number} 页第 {attempt} 次重试...")
+                metrics.incr('page_retries', site=adapter.name)
+                time.sleep(attempt * RETRY_BACKOFF_SECONDS)
+            try:
+                soup = self._load_page(driver, adapter, page_number)
+                if page_number == 1:
+                    crawl.total_pages = adapter.total_pages(soup)
+                with metrics.timer('extract', site=adapter.name):
+                    return adapter.extract_products(soup, page_number)
+            except Exception as e:
+                print(f"[{adapter.name}] 处理第 {page_number} 页时出错: {e}")
+                metrics.incr('page_errors', site=adapter.name)
+        return None
+
+    def _plan_next_pages(self, crawl, page_number, products):
+        """根据刚完成的页面决定接下来要抓取哪些页面。"""
+        adapter = crawl.adapter
+        crawl.consecutive_failures = crawl.consecutive_failures + 1 if products is None else 0
+        if crawl.total_pages is not None:
+            if page_number == 1:
+                for next_page in range(2, crawl.total_pages + 1):
+                    crawl.add_page(next_page)
+        elif products is None:
+            # 总页数未知时逐页前进；连续多页失败通常说明被网站拦截，停止抓取而不是继续重试
+            if crawl.consecutive_failures < adapter.max_consecutive_failures:
+                crawl.add_page(page_number + 1)
+            else:
+                print(f"[{adapter.name}] 连续 {crawl.consecutive_failures} 页抓取失败，停止抓取该站点。")
+        elif products:
+            # 遇到没有商品的页面即停止
+            crawl.add_page(page_number + 1)
+
+    def _run_session(self, crawl):
+        adapter = crawl.adapter
+        driver = None
+        session_alive = True
+        try:
+            while True:
+                page_number = crawl.next_page()
+                if page_number is None:
+                    break
+                try:
+                    if driver is None:
+                        with metrics.timer('driver_start', site=adapter.name):
+                            driver = self._create_driver(adapter)
+                        with metrics.timer('warm_up', site=adapter.name):
+                            adapter.warm_up(driver)
+                    with metrics.timer('page_total', site=adapter.name):
+                        products = self._crawl_page(driver, crawl, page_number)
+                    if products is None:
+                        crawl.failed_pages.append(page_number)
+                        metrics.incr('page_failures', site=adapter.name)
+                    else:
+                        crawl.products_by_page[page_number] = products
+                        metrics.incr('pages', site=adapter.name)
+                        metrics.incr('products', len(products), site=adapter.name, page=page_number)
+                        print(f"[{adapter.name}] 第 {page_number} 页找到 {len(products)} 个商品。")
+                    self._plan_next_pages(crawl, page_number, products)
+                except Exception as e:
+                    # 只结束当前会话，页面交给该站点仍在运行的其他会话
+                    session_alive = False
+                    if crawl.session_failed(page_number):
+                        print(f"[{adapter.name}] 浏览器会话出错，结束该会话，第 {page_number} 页交给其他会话: {e}")
+                    else:
+                        print(f"[{adapter.name}] 浏览器会话出错，且没有其他可用会话，停止抓取该站点: {e}")
+                        crawl.failed_pages.append(page_number)
+                finally:
+                    crawl.page_done()
+                if not session_alive:
+                    break
+        finally:
+            if session_alive:
+                crawl.session_finished()
+            if driver:
+                driver.quit()
+
+    def _write_output(self, crawl):
+        adapter = crawl.adapter
+        rows = crawl.rows()
+        if not rows:
+            print(f"[{adapter.name}] 没有提取到任何产品数据，未创建 Excel 文件。")
+            return None
+        print(f"[{adapter.name}] 正在将提取的 {len(rows)} 条产品数据保存到 Excel 文件: {adapter.output_excel_file}")
+        try:
+            with metrics.timer('write', site=adapter.name):
+                df = pd.DataFrame(rows, columns=adapter.columns).fillna("N/A")
+                df.to_excel(adapter.output_excel_file, index=False, engine='openpyxl')
+            print(f"[{adapter.name}] Excel 文件 '{adapter.output_excel_file}' 保存成功。")
+            return df
+        except ImportError:
+            print("错误: 需要安装 'pandas' 和 'openpyxl' 库来保存 Excel 文件。请运行: pip install pandas openpyxl")
+        except Exception as ex:
+            print(f"[{adapter.name}] 保存 Excel 文件时出错: {ex}")
+        return None
+
+    def _run_site(self, crawl, results):
+        """运行单个站点的所有浏览器会话，站点抓取完成后立即写出结果，不等待其他站点。"""
+        crawl.add_page(1)
+        sessions = [
+            threading.Thread(target=self._run_session, args=(crawl,), daemon=True)
+            for _ in range(crawl.adapter.max_sessions)
+        ]
+        # 先登记所有会话，避免第一个会话在其他会话启动前出错时误判为没有可用会话
+        for session in sessions:
+            crawl.session_started()
+        for session in sessions:
+            session.start()
+        for session in sessions:
+            session.join()
+
+        if crawl.failed_pages:
+            print(f"[{crawl.adapter.name}] 以下页面抓取失败: {sorted(crawl.failed_pages)}")
+        results[crawl.adapter.name] = self._write_output(crawl)
+
+    def run(self):
+        """并行抓取所有站点，返回 {站点名称: DataFrame 或 None}。"""
+        results = {}
+        sites = [
+            threading.Thread(target=self._run_site, args=(crawl, results), daemon=True)
+            for crawl in self.crawls
+        ]
+        for site in sites:
+            site.start()
+        for site in sites:
+            site.join()
+        return {crawl.adapter.name: results.get(crawl.adapter.name) for crawl in self.crawls}
+
+def exit_code(results):
+    """任一站点没有产出数据时返回非零退出码，便于调用方区分成功与失败。"""
+    return 0 if all(df is not None for df in results.values()) else 1
@@ -1,5 +1,10 @@
 import os
 import re
+import json
+import time
+import hashlib
+import queue
+import threading
 import requests
 from lxml import html
 import pypandoc
@@ -10,24 +15,41 @@ from tqdm import tqdm
 # --- 配置 ---
 
 # !!! 关键：并行数量配置 !!!
-# 设置同时执行任务的最大线程数。建议范围 5-16。
+# 设置同时执行下载任务的最大线程数（I/O 阶段）。建议范围 5-16。
 # 设置过高可能会导致IP被封锁或程序出错。
 MAX_WORKERS = 50
 
+# Pandoc 转换是 CPU 密集型任务，进程池大小与 CPU 核心数一致，
+# 避免几十个 pandoc 子进程与下载线程争抢 CPU。
+CONVERT_WORKERS = os.cpu_count() or 1
+
+# 各阶段之间的有界队列长度，队列满时上游阶段会阻塞等待（背压）。
+FETCHED_QUEUE_SIZE = MAX_WORKERS
+CONVERT_QUEUE_SIZE = CONVERT_WORKERS * 2
+# 向有界队列放入数据时的等待间隔（秒），每次超时后检查是否需要停止
+QUEUE_PUT_TIMEOUT = 1
+
 START_URL = "https://sbr-pet.apra.gov.au/ARF/ARF.html"
 OUTPUT_DIR = "ARF_Word_Documents"
+# 磁盘 HTTP 缓存目录：保存每个URL的 ETag/Last-Modified 和页面内容，用于增量重跑
+HTTP_CACHE_DIR = ".http_cache"
 XPATH_LEVEL_1 = "/html/body/div/div[2]/div/table/tbody/tr/td[3]/div/a"
 XPATH_LEVEL_2 = "//a[starts-with(@href, 'attributes/')]"
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# 阶段之间传递的结束标记
+_STAGE_DONE = object()
+
 def sanitize_filename(filename):
     """移除文件名中的非法字符。"""
     return re.sub(r'[\\/*?:"<>|]', "_", filename)
 
-def fetch_html(url, headers):
-    """封装的HTML下载函数，返回文本内容或None。"""
+def fetch_html(url, headers, cache=None):
+    """封装的HTML下载函数，返回文本内容或None。传入 cache 时发送条件请求。"""
+    if cache is not None:
+        return cache.fetch(url, headers)
     try:
         response = requests.get(url, headers=headers, timeout=45)
         response.raise_for_status()
@@ -37,40 +59,185 @@ def fetch_html(url, headers):
         # 在工作线程中，错误信息通过返回值传递
         return None
 
-def process_primary_link(link_info):
+def page_digest(page_html):
+    """计算页面内容的摘要，用于判断报告的源页面是否发生变化。"""
+    return hashlib.sha1(page_html.encode('utf-8')).hexdigest()
+
+class HttpCache:
     """
-    处理单个主报告链接的完整流程（下载、解析、合并、转换）。
-    这个函数将在独立的线程中被执行。
+    基于磁盘的 HTTP 缓存。
+    为每个URL保存 ETag / Last-Modified 和页面内容，再次请求时发送
+    If-None-Match / If-Modified-Since，服务器返回 304 时直接使用缓存内容。
+    同时为每份报告保存生成时所用源页面的摘要清单，用来判断报告是否需要重新生成。
     """
-    # 从传入的字典中解析信息
-    index = link_info['index']
-    total = link_info['total']
-    link_text = link_info['text']
-    relative_url = link_info['href']
 
-    # --- 文件名和URL处理 ---
+    def __init__(self, cache_dir=HTTP_CACHE_DIR):
+        self.pages_dir = os.path.join(cache_dir, "pages")
+        self.reports_dir = os.path.join(cache_dir, "reports")
+        os.makedirs(self.pages_dir, exist_ok=True)
+        os.makedirs(self.reports_dir, exist_ok=True)
+        self.counts = {'304': 0, '200': 0, 'stale': 0, 'failed': 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_json(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _save_json(path, data):
+        # 先写临时文件再替换，避免多线程或中断时留下半个文件
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _page_path(self, url):
+        return os.path.join(self.pages_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".json")
+
+    def _report_path(self, output_filepath):
+        name = os.path.basename(output_filepath)
+        return os.path.join(self.reports_dir, hashlib.sha1(name.encode('utf-8')).hexdigest() + ".json")
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def fetch(self, url, headers):
+        """
+        发送条件请求，返回页面文本（未变化时返回缓存内容）。
+        请求失败时如果有缓存则返回缓存内容（stale-if-error），否则返回None。
+        """
+        page_path = self._page_path(url)
+        entry = self._load_json(page_path)
+        request_headers = dict(headers)
+        if entry:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = requests.get(url, headers=request_headers, timeout=45)
+            if response.status_code == 304 and entry:
+                self._count('304')
+                return entry['body']
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+        except requests.exceptions.RequestException:
+            if entry and entry.get('body') is not None:
+                self._count('stale')
+                return entry['body']
+            self._count('failed')
+            return None
+
+        self._count('200')
+        try:
+            self._save_json(page_path, {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'body': response.text,
+            })
+        except OSError as e:
+            # 缓存写入失败只影响下次增量运行，本次仍返回下载到的内容
+            print(f"警告：写入缓存 '{url}' 失败: {e}")
+        return response.text
+
+    def is_report_current(self, output_filepath, page_digests):
+        """报告文件存在，且生成它时所用的源页面全部未变化时返回 True。"""
+        if not os.path.exists(output_filepath):
+            return False
+        manifest = self._load_json(self._report_path(output_filepath))
+        return manifest is not None and manifest.get('pages') == page_digests
+
+    def save_report_manifest(self, output_filepath, page_digests):
+        """报告成功生成后记录其源页面摘要。"""
+        self._save_json(self._report_path(output_filepath), {
+            'output': output_filepath,
+            'pages': page_digests,
+        })
+
+    def summary(self):
+        return (
+            f"HTTP 缓存: 未变化(304) {self.counts['304']} 次，"
+            f"重新下载(200) {self.counts['200']} 次，请求失败改用缓存 {self.counts['stale']} 次，"
+            f"失败 {self.counts['failed']} 次"
+        )
+
+class StageStats:
+    """记录单个流水线阶段的处理数量和耗时，用于计算该阶段的吞吐量。"""
+
+    def __init__(self, name, unit="个"):
+        self.name = name
+        self.unit = unit
+        self.count = 0
+        self.busy_seconds = 0.0
+        self.first_start = None
+        self.last_finish = None
+        self._lock = threading.Lock()
+
+    def record(self, started, finished, count=1):
+        with self._lock:
+            self.count += count
+            self.busy_seconds += finished - started
+            if self.first_start is None or started < self.first_start:
+                self.first_start = started
+            if self.last_finish is None or finished > self.last_finish:
+                self.last_finish = finished
+
+    def summary(self):
+        if not self.count:
+            return f"{self.name}: 未处理任何{self.unit}。"
+        wall = max(self.last_finish - self.first_start, 1e-9)
+        return (
+            f"{self.name}: 共 {self.count} {self.unit}，阶段耗时 {wall:.1f}s，"
+            f"吞吐量 {self.count / wall:.2f} {self.unit}/s，累计工作时间 {self.busy_seconds:.1f}s"
+        )
+
+def build_report_paths(link_info):
+    """根据链接信息计算主报告URL、输出文件路径和日志前缀。"""
+    relative_url = link_info['href']
     primary_full_url = urljoin(START_URL, relative_url)
     url_filename = os.path.basename(relative_url)
     unique_part = os.path.splitext(url_filename)[0]
-    filename_base = sanitize_filename(f"{link_text} ({unique_part})")
+    filename_base = sanitize_filename(f"{link_info['text']} ({unique_part})")
     output_filepath = os.path.join(OUTPUT_DIR, f"{filename_base}.docx")
-    
     # 构造日志前缀，方便追踪
-    log_prefix = f"[Worker {index+1}/{total}] {filename_base}"
-
-    if os.path.exists(output_filepath):
-        return f"{log_prefix}: 已跳过，文件已存在。"
+    log_prefix = f"[Worker {link_info['index']+1}/{link_info['total']}] {filename_base}"
+    return primary_full_url, output_filepath, log_prefix
 
-    html_parts_for_word = []
+def fetch_report_pages(link_info, page_stats, cache):
+    """
+    阶段一（I/O）：通过条件请求下载单个主报告页面及其所有子页面。
+    返回包含已下载页面的字典；如果无需继续处理（例如所有源页面均未变化），
+    则在 'result' 中给出结果信息。
+    """
+    primary_full_url, output_filepath, log_prefix = build_report_paths(link_info)
+    report = {
+        'link_text': link_info['text'],
+        'output_filepath': output_filepath,
+        'log_prefix': log_prefix,
+        'primary_url': primary_full_url,
+        'primary_html': None,
+        'sub_pages': [],
+        'page_digests': {},
+        # 下载失败且没有缓存可用的子页面
+        'missing_pages': [],
+        'result': None,
+    }
 
-    # --- 内容抓取与合并 ---
-    primary_page_html = fetch_html(primary_full_url, HEADERS)
+    started = time.perf_counter()
+    primary_page_html = fetch_html(primary_full_url, HEADERS, cache)
+    page_stats.record(started, time.perf_counter())
     if not primary_page_html:
-        return f"{log_prefix}: 失败，无法下载主报告页面。"
-
-    html_parts_for_word.append(f"<h1>主报告: {link_text}</h1>")
-    html_parts_for_word.append(f"<p><em>来源URL: {primary_full_url}</em></p><hr>")
-    html_parts_for_word.append(primary_page_html)
+        report['result'] = f"{log_prefix}: 失败，无法下载主报告页面。"
+        return report
+    report['primary_html'] = primary_page_html
+    report['page_digests'][primary_full_url] = page_digest(primary_page_html)
 
     tree_level_2 = html.fromstring(primary_page_html)
     sub_links = tree_level_2.xpath(XPATH_LEVEL_2)
@@ -81,34 +248,216 @@ def process_primary_link(link_info):
             continue
         sub_full_url = urljoin(primary_full_url, sub_relative_url)
         sub_link_text = sub_link_element.text_content().strip()
-        sub_page_html = fetch_html(sub_full_url, HEADERS)
+        started = time.perf_counter()
+        sub_page_html = fetch_html(sub_full_url, HEADERS, cache)
+        page_stats.record(started, time.perf_counter())
         if sub_page_html:
-            html_parts_for_word.append(f"<hr><h2>子页面: {sub_link_text}</h2>")
-            html_parts_for_word.append(f"<p><em>来源URL: {sub_full_url}</em></p><hr>")
-            html_parts_for_word.append(sub_page_html)
+            report['sub_pages'].append((sub_link_text, sub_full_url, sub_page_html))
+            report['page_digests'][sub_full_url] = page_digest(sub_page_html)
+        else:
+            report['missing_pages'].append(sub_full_url)
+
+    if report['missing_pages'] and os.path.exists(output_filepath):
+        # 不能用缺少子页面的内容覆盖已有的完整报告，也不更新其缓存清单
+        report['result'] = (
+            f"{log_prefix}: 失败，{len(report['missing_pages'])} 个子页面无法下载，已保留原有报告。"
+        )
+    # 只有至少一个源页面发生变化（或报告文件不存在）时才需要重新生成
+    elif cache.is_report_current(output_filepath, report['page_digests']):
+        report['result'] = f"{log_prefix}: 已跳过，源页面均未变化。"
 
-    # --- 合并与转换 ---
-    combined_html = "".join(html_parts_for_word)
+    return report
+
+def assemble_report_html(report):
+    """阶段二：把主报告页面和子页面拼接成一份完整的 HTML。"""
+    html_parts_for_word = [
+        f"<h1>主报告: {report['link_text']}</h1>",
+        f"<p><em>来源URL: {report['primary_url']}</em></p><hr>",
+        report['primary_html'],
+    ]
+    for sub_link_text, sub_full_url, sub_page_html in report['sub_pages']:
+        html_parts_for_word.append(f"<hr><h2>子页面: {sub_link_text}</h2>")
+        html_parts_for_word.append(f"<p><em>来源URL: {sub_full_url}</em></p><hr>")
+        html_parts_for_word.append(sub_page_html)
+    return "".join(html_parts_for_word)
+
+def convert_html_to_docx(combined_html, output_filepath, log_prefix):
+    """
+    阶段三（CPU）：调用 pandoc 将 HTML 转换为 Word 文档。
+    这个函数在独立的进程中执行，因此必须定义在模块顶层。
+    """
+    started = time.perf_counter()
     try:
         pypandoc.convert_text(
             source=combined_html, to='docx', format='html',
             outputfile=output_filepath, extra_args=['--standalone', '--quiet']
         )
-        return f"{log_prefix}: 成功保存。"
+        return True, f"{log_prefix}: 成功保存。", started, time.perf_counter()
     except Exception as e:
         # 检查是否是Pandoc未找到的致命错误
         if "pandoc" in str(e).lower() and "not found" in str(e).lower():
             # 这是一个应该停止所有任务的致命错误
-            raise e
-        return f"{log_prefix}: 转换失败 - {e}"
+            raise RuntimeError(str(e))
+        return False, f"{log_prefix}: 转换失败 - {e}", started, time.perf_counter()
+
+class ReportPipeline:
+    """
+    分阶段的处理流水线：
+    下载线程 (I/O) -> HTML 拼接线程 -> pandoc 转换进程池 (CPU)。
+    各阶段之间通过有界队列相连，下游处理不过来时上游会自动放慢。
+    """
+
+    def __init__(self, tasks, cache, fetch_workers=MAX_WORKERS, convert_workers=CONVERT_WORKERS):
+        self.tasks = tasks
+        self.cache = cache
+        self.fetch_workers = fetch_workers
+        self.convert_workers = convert_workers
+        self.task_queue = queue.Queue()
+        self.fetched_queue = queue.Queue(maxsize=FETCHED_QUEUE_SIZE)
+        # 限制已提交但尚未完成的转换任务数量，相当于转换阶段的有界队列
+        self.convert_slots = threading.BoundedSemaphore(CONVERT_QUEUE_SIZE)
+        self.stop_event = threading.Event()
+        self.fatal_error = None
+        self.results = []
+        self.results_lock = threading.Lock()
+        self.progress = None
+        self.stats = {
+            'pages': StageStats("下载页面", "页"),
+            'fetch': StageStats("下载阶段", "份报告"),
+            'assemble': StageStats("拼接阶段", "份报告"),
+            'convert': StageStats("转换阶段", "份报告"),
+        }
+
+    def _add_result(self, message):
+        with self.results_lock:
+            self.results.append(message)
+        self.progress.update(1)
+
+    def _fail(self, error):
+        """记录致命错误并通知所有阶段停止。"""
+        with self.results_lock:
+            if self.fatal_error is None:
+                self.fatal_error = error
+        self.stop_event.set()
+
+    def _put_fetched(self, report):
+        """把报告放入下一阶段的队列；队列已满时定期检查停止标记，避免永久阻塞。"""
+        while not self.stop_event.is_set():
+            try:
+                self.fetched_queue.put(report, timeout=QUEUE_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fetch_worker(self):
+        while not self.stop_event.is_set():
+            try:
+                link_info = self.task_queue.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            try:
+                report = fetch_report_pages(link_info, self.stats['pages'], self.cache)
+            except Exception as e:
+                # 单份报告的解析错误不应终止整个下载线程
+                log_prefix = f"[Worker {link_info['index']+1}/{link_info['total']}] {link_info['text']}"
+                report = {'log_prefix': log_prefix, 'result': f"{log_prefix}: 失败，处理页面时出错 - {e}"}
+            self.stats['fetch'].record(started, time.perf_counter())
+            if not self._put_fetched(report):
+                return
+
+    def _assemble_report(self, executor, report):
+        started = time.perf_counter()
+        combined_html = assemble_report_html(report)
+        self.stats['assemble'].record(started, time.perf_counter())
+
+        # 转换阶段已满时在此阻塞，进而让下载阶段的队列也逐渐填满
+        self.convert_slots.acquire()
+        try:
+            future = executor.submit(
+                convert_html_to_docx, combined_html,
+                report['output_filepath'], report['log_prefix']
+            )
+        except Exception:
+            self.convert_slots.release()
+            raise
+        future.add_done_callback(
+            lambda f, r=report: self._on_converted(f, r)
+        )
+
+    def _assemble_worker(self, executor):
+        # 出错后仍继续清空队列，保证下载线程不会因队列已满而一直阻塞
+        while True:
+            report = self.fetched_queue.get()
+            if report is _STAGE_DONE:
+                return
+            if report['result'] is not None:
+                self._add_result(report['result'])
+                continue
+            if self.stop_event.is_set():
+                self._add_result(f"{report['log_prefix']}: 已取消，流水线发生致命错误。")
+                continue
+            try:
+                self._assemble_report(executor, report)
+            except Exception as e:
+                self._fail(e)
+                self._add_result(f"{report['log_prefix']}: 拼接或提交转换失败 - {e}")
+
+    def _on_converted(self, future, report):
+        self.convert_slots.release()
+        log_prefix = report['log_prefix']
+        try:
+            succeeded, message, started, finished = future.result()
+            self.stats['convert'].record(started, finished)
+        except Exception as e:
+            self._fail(e)
+            self._add_result(f"{log_prefix}: 转换失败 - {e}")
+            return
+
+        if succeeded and report['missing_pages']:
+            # 首次生成时缺少部分子页面：保存已有内容，但不写缓存清单，下次运行会重新生成
+            message += f"（警告：缺少 {len(report['missing_pages'])} 个无法下载的子页面）"
+        elif succeeded:
+            try:
+                self.cache.save_report_manifest(report['output_filepath'], report['page_digests'])
+            except OSError as e:
+                # 文档已生成，只是下次运行无法判断是否未变化，会重新生成该报告
+                message += f"（警告：无法写入缓存清单 - {e}）"
+        self._add_result(message)
+
+    def run(self):
+        for link_info in self.tasks:
+            self.task_queue.put(link_info)
+
+        with tqdm(total=len(self.tasks), desc="处理报告中") as self.progress, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=self.convert_workers) as executor:
+            fetchers = [
+                threading.Thread(target=self._fetch_worker, daemon=True)
+                for _ in range(min(self.fetch_workers, len(self.tasks)) or 1)
+            ]
+            assembler = threading.Thread(target=self._assemble_worker, args=(executor,), daemon=True)
+            assembler.start()
+            for fetcher in fetchers:
+                fetcher.start()
+            for fetcher in fetchers:
+                fetcher.join()
+            self.fetched_queue.put(_STAGE_DONE)
+            assembler.join()
+            # 退出 with 语句时会等待所有已提交的转换任务完成
+
+        if self.fatal_error is not None:
+            raise self.fatal_error
+        return self.results
 
 def main():
     """主执行函数"""
-    print(f"脚本开始执行 (V5 - 并行版，最大并发数: {MAX_WORKERS})...")
+    print(f"脚本开始执行 (V6 - 流水线版，下载线程: {MAX_WORKERS}，转换进程: {CONVERT_WORKERS})...")
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    cache = HttpCache(HTTP_CACHE_DIR)
 
     print(f"正在访问主索引页面: {START_URL}")
-    index_page_html = fetch_html(START_URL, HEADERS)
+    index_page_html = fetch_html(START_URL, HEADERS, cache)
     if not index_page_html:
         print("错误：无法获取主索引页，脚本终止。")
         return
@@ -130,21 +479,23 @@ def main():
             "href": link_element.get('href', '').replace('\\', '/'),
         })
 
-    print(f"成功找到 {total_links} 个主报告链接。开始并行处理...")
+    print(f"成功找到 {total_links} 个主报告链接。开始流水线处理...")
+
+    pipeline = ReportPipeline(tasks, cache)
+    results = pipeline.run()
 
-    # 使用线程池和tqdm进度条来执行所有任务
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # 使用tqdm来包装，自动处理进度条
-        # executor.map会保持任务的原始顺序
-        results = list(tqdm(executor.map(process_primary_link, tasks), total=total_links, desc="处理报告中"))
-    
     print("-" * 40)
     print("所有任务处理完毕。以下是执行摘要：")
     # 打印出所有非None的结果（通常是错误或跳过信息）
     for res in results:
         if res:
             print(res)
+    print("-" * 40)
+    print("各阶段吞吐量：")
+    for stage in pipeline.stats.values():
+        print(stage.summary())
+    print(cache.summary())
     print("脚本执行完毕！")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
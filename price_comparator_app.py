@@ -1,37 +1,23 @@
 import pandas as pd
 import gradio as gr
 import numpy as np
+from crawl_metrics import metrics
 
-def compare_matched_files(
-    coles_matched_file,
-    woolworths_matched_file,
-    price_col_name_c,
-    price_col_name_w
-):
+def parse_price_column(prices):
+    """把 "$1,234.50" 形式的价格列转换为数值，无法解析的值变为 NaN。"""
+    return pd.to_numeric(
+        prices.astype(str).str.replace(r'[$,]', '', regex=True),
+        errors='coerce'
+    )
+
+def build_price_comparison(df_coles, df_ww, price_col_name_c, price_col_name_w):
     """
-    Gradio调用的主函数，用于读取两个已匹配的Excel文件并进行比价。
-    此版本新增了对“产品链接”字段的支持，并修复了因条形码重复导致输出行数爆炸的问题。
+    基于条形码合并两个平台的数据并比价，返回 (比价结果 DataFrame, 状态文本)。
+    调用前需确认两个 DataFrame 中都存在'条形码'列和对应的价格列。
     """
-    if coles_matched_file is None or woolworths_matched_file is None:
-        return pd.DataFrame(), None, "错误：请同时上传Coles和Woolworths的匹配文件。"
-
-    try:
-        df_coles = pd.read_excel(coles_matched_file.name)
-        df_ww = pd.read_excel(woolworths_matched_file.name)
-    except Exception as e:
-        return pd.DataFrame(), None, f"文件读取失败: {e}"
-
-    # --- 核心检查 ---
-    if '条形码' not in df_coles.columns or '条形码' not in df_ww.columns:
-        return pd.DataFrame(), None, "错误：一个或两个文件中都缺少'条形码'列。"
-    if price_col_name_c not in df_coles.columns:
-        return pd.DataFrame(), None, f"错误：在Coles文件中找不到价格列 '{price_col_name_c}'"
-    if price_col_name_w not in df_ww.columns:
-        return pd.DataFrame(), None, f"错误：在Woolworths文件中找不到价格列 '{price_col_name_w}'"
-
     # --- 关键修复：合并前处理重复的条形码 ---
-    df_coles.dropna(subset=['条形码'], inplace=True)
-    df_ww.dropna(subset=['条形码'], inplace=True)
+    df_coles = df_coles.dropna(subset=['条形码'])
+    df_ww = df_ww.dropna(subset=['条形码'])
 
     initial_rows_c = len(df_coles)
     initial_rows_w = len(df_ww)
@@ -61,10 +47,7 @@ def compare_matched_files(
 
     for col in [price_c_suffixed, price_w_suffixed]:
         if col in merged_df.columns:
-            merged_df[col] = pd.to_numeric(
-                merged_df[col].astype(str).str.replace(r'[$,]', '', regex=True),
-                errors='coerce'
-            )
+            merged_df[col] = parse_price_column(merged_df[col])
 
     # --- 比价逻辑 ---
     conditions = [
@@ -114,9 +97,45 @@ def compare_matched_files(
         link_col_w: 'Woolworths_产品链接'
     }, inplace=True)
 
+    return final_df, status_update
+
+def compare_matched_files(
+    coles_matched_file,
+    woolworths_matched_file,
+    price_col_name_c,
+    price_col_name_w
+):
+    """
+    Gradio调用的主函数，用于读取两个已匹配的Excel文件并进行比价。
+    此版本新增了对“产品链接”字段的支持，并修复了因条形码重复导致输出行数爆炸的问题。
+    """
+    if coles_matched_file is None or woolworths_matched_file is None:
+        return pd.DataFrame(), None, "错误：请同时上传Coles和Woolworths的匹配文件。"
+
+    try:
+        with metrics.timer('compare_read'):
+            df_coles = pd.read_excel(coles_matched_file.name)
+            df_ww = pd.read_excel(woolworths_matched_file.name)
+    except Exception as e:
+        return pd.DataFrame(), None, f"文件读取失败: {e}"
+
+    # --- 核心检查 ---
+    if '条形码' not in df_coles.columns or '条形码' not in df_ww.columns:
+        return pd.DataFrame(), None, "错误：一个或两个文件中都缺少'条形码'列。"
+    if price_col_name_c not in df_coles.columns:
+        return pd.DataFrame(), None, f"错误：在Coles文件中找不到价格列 '{price_col_name_c}'"
+    if price_col_name_w not in df_ww.columns:
+        return pd.DataFrame(), None, f"错误：在Woolworths文件中找不到价格列 '{price_col_name_w}'"
+
+    # --- 合并与比价 ---
+    with metrics.timer('compare'):
+        final_df, status_update = build_price_comparison(df_coles, df_ww, price_col_name_c, price_col_name_w)
+    metrics.incr('compare_rows', len(final_df))
+
     # --- 保存并返回结果 ---
     output_path = "final_price_comparison.xlsx"
-    final_df.to_excel(output_path, index=False)
+    with metrics.timer('compare_write'):
+        final_df.to_excel(output_path, index=False)
 
     final_status = status_update + f"\n合并完成！共生成 {len(final_df)} 行对比数据。结果如下，您也可以下载Excel文件。"
     